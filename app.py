@@ -5,13 +5,14 @@ import time
 import subprocess
 from datetime import datetime
 from dotenv import load_dotenv
-from google import genai
 
 # Import functions from existing scripts
 from discord_export import (
     check_docker, export_discord_channel, compress_conversation,
     load_last_timestamp, save_last_timestamp, get_most_recent_timestamp
 )
+from message_filter import load_filter_config, filter_conversation, format_filter_stats
+from gemini_pool import get_client_pool
 
 # Set page config
 st.set_page_config(
@@ -28,17 +29,26 @@ def save_keys_to_env(discord_token, gemini_api_key):
         f.write(f"GEMINI_API_KEY={gemini_api_key}\n")
     load_dotenv(override=True)
 
-# Function to setup Gemini model
-def setup_gemini_model():
-    """Configure and return Gemini model instance."""
+# Function to ask Gemini a question about a conversation
+def ask_gemini(summary, question):
+    """Ask a question about a conversation summary through the shared Gemini client pool.
+
+    Every session shares one rate-limited pool, and identical in-flight
+    questions about the same conversation are coalesced into a single call.
+    """
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         st.error("Gemini API key not found. Please provide it in the settings.")
         return None
 
-    client = genai.Client(api_key=api_key)
-    chat = client.chats.create(model="gemini-2.0-flash")
-    return chat
+    # Limiting to 50K chars to avoid token limits
+    context_prompt = f"""Here's a Discord conversation summary to analyze:
+
+{summary[:50000]}
+
+Please keep your responses focused on the content of this conversation."""
+
+    return get_client_pool().generate(api_key, "gemini-2.0-flash", [context_prompt, question])
 
 # Sidebar for settings
 with st.sidebar:
@@ -64,6 +74,19 @@ with st.sidebar:
     else:
         st.error("Docker is not running or not installed")
         st.info("This tool requires Docker to be installed and running. Please check the Docker installation guide.")
+    
+    # Shared Gemini pool usage (across all sessions)
+    st.subheader("Gemini Usage")
+    pool_stats = get_client_pool().get_stats()
+    st.caption(f"Queue depth: {pool_stats['queue_depth']} (rate limit: {pool_stats['rate_limit_queue']}, "
+               f"backoff: {pool_stats['backoff_queue']}, coalesced: {pool_stats['coalesced_queue']}) | "
+               f"In flight: {pool_stats['in_flight']}")
+    st.caption(f"Wait per request: avg {pool_stats['avg_wait_seconds']:.1f}s, max {pool_stats['max_wait_seconds']:.1f}s "
+               f"(rate limit: {pool_stats['rate_limit_wait_seconds']:.0f}s, backoff: {pool_stats['backoff_wait_seconds']:.0f}s, "
+               f"coalesced: {pool_stats['coalesced_wait_seconds']:.0f}s total)")
+    st.caption(f"Requests: {pool_stats['requests']} | API calls: {pool_stats['api_calls']} | "
+               f"Coalesced: {pool_stats['coalesced']} | Retries: {pool_stats['retries']} | "
+               f"429s: {pool_stats['rate_limited']}")
 
 # Main content
 st.title("Discord Chat Analyzer")
@@ -298,6 +321,15 @@ with tab3:
                                    json_files,
                                    index=None)
         
+        # Noise filter options
+        with st.expander("Noise Filter", expanded=False):
+            filter_enabled = st.checkbox("Filter noise before analysis", value=True,
+                                         help="Drop bot, system and emoji-only messages and collapse near-duplicates.")
+            filter_drop_bots = st.checkbox("Drop bot messages", value=True)
+            filter_blocked_authors = st.text_input("Blocked authors (comma separated names or IDs)")
+            filter_collapse = st.checkbox("Collapse near-duplicate messages", value=True)
+            filter_threshold = st.slider("Near-duplicate similarity threshold", 0.5, 1.0, 0.85, 0.05)
+        
         if selected_file:
             if not os.getenv("GEMINI_API_KEY"):
                 st.error("Please add your Gemini API key in Settings to use AI analysis.")
@@ -307,53 +339,53 @@ with tab3:
                     with open(json_path, "r", encoding="utf-8") as f:
                         conversation = json.load(f)
                     
+                    # Filter noise before compressing
+                    if filter_enabled:
+                        filter_config = load_filter_config(overrides={
+                            "drop_bots": filter_drop_bots,
+                            "blocked_authors": [a.strip() for a in filter_blocked_authors.split(",") if a.strip()],
+                            "collapse_duplicates": filter_collapse,
+                            "similarity_threshold": filter_threshold,
+                        })
+                        conversation, filter_stats = filter_conversation(conversation, filter_config)
+                        st.info(format_filter_stats(filter_stats))
+                    
                     # Compress conversation for analysis
                     st.info("Preparing conversation for analysis...")
                     summary = compress_conversation(conversation)
                     
-                    # Initialize the Gemini model for chat
-                    chat_session = setup_gemini_model()
-                    if chat_session:
-                        # Send initial context message
-                        with st.spinner("Initializing AI analysis..."):
-                            context_prompt = f"""Here's a Discord conversation summary to analyze:
-
-{summary[:50000]}  # Limiting to 50K chars to avoid token limits
-
-Please keep your responses focused on the content of this conversation."""
-                            
-                            response = chat_session.send_message(context_prompt)
-                        
-                        st.success("AI analysis ready! Ask questions about the conversation.")
-                        
-                        # Create chat interface
-                        query = st.text_input("Ask a question about this conversation:")
-                        if query:
+                    st.success("AI analysis ready! Ask questions about the conversation.")
+                    
+                    # Create chat interface
+                    query = st.text_input("Ask a question about this conversation:")
+                    if query:
+                        with st.spinner("Analyzing..."):
+                            try:
+                                answer = ask_gemini(summary, query)
+                                if answer:
+                                    st.markdown(answer)
+                            except Exception as e:
+                                st.error(f"Error getting AI response: {str(e)}")
+                    
+                    # Suggested questions
+                    st.markdown("### Suggested questions:")
+                    suggested_questions = [
+                        "What are the main topics discussed in this conversation?",
+                        "Summarize the key points from this conversation.",
+                        "Who are the most active participants?",
+                        "Are there any decisions or action items in this conversation?",
+                        "What's the overall sentiment of this conversation?"
+                    ]
+                    
+                    for q in suggested_questions:
+                        if st.button(q):
                             with st.spinner("Analyzing..."):
                                 try:
-                                    response = chat_session.send_message(query)
-                                    st.markdown(response.text)
+                                    answer = ask_gemini(summary, q)
+                                    if answer:
+                                        st.markdown(answer)
                                 except Exception as e:
                                     st.error(f"Error getting AI response: {str(e)}")
-                        
-                        # Suggested questions
-                        st.markdown("### Suggested questions:")
-                        suggested_questions = [
-                            "What are the main topics discussed in this conversation?",
-                            "Summarize the key points from this conversation.",
-                            "Who are the most active participants?",
-                            "Are there any decisions or action items in this conversation?",
-                            "What's the overall sentiment of this conversation?"
-                        ]
-                        
-                        for q in suggested_questions:
-                            if st.button(q):
-                                with st.spinner("Analyzing..."):
-                                    try:
-                                        response = chat_session.send_message(q)
-                                        st.markdown(response.text)
-                                    except Exception as e:
-                                        st.error(f"Error getting AI response: {str(e)}")
                 except Exception as e:
                     st.error(f"Error processing conversation: {str(e)}")
 
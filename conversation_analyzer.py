@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import json
 import os
+import re
 import subprocess
 import argparse
 from dotenv import load_dotenv
@@ -11,6 +12,7 @@ from discord_export import (
     check_docker, export_discord_channel, compress_conversation,
     load_last_timestamp, save_last_timestamp, get_most_recent_timestamp
 )
+from message_filter import load_filter_config, filter_conversation, format_filter_stats
 
 def setup_gemini_model():
     """Configure and return Gemini model instance."""
@@ -68,8 +70,20 @@ def main():
     parser.add_argument('--start-date', help='Start date in ISO format (e.g., "2023-01-01")')
     parser.add_argument('--end-date', help='End date in ISO format (e.g., "2023-12-31")')
     parser.add_argument('--force-full', action='store_true', help='Force full export instead of incremental')
+    parser.add_argument('--filter-config', help='JSON file overriding the default noise filter rules')
+    parser.add_argument('--no-filter', action='store_true', help='Send all messages without noise filtering')
     args = parser.parse_args()
 
+    # Validate the filter config before exporting, so a bad config can't
+    # advance the incremental timestamp past messages that were never analyzed
+    filter_config = None
+    if not args.no_filter:
+        try:
+            filter_config = load_filter_config(args.filter_config)
+        except (json.JSONDecodeError, FileNotFoundError, re.error) as e:
+            print(f"Error loading filter config: {e}")
+            return
+
     # Load environment variables
     load_dotenv()
     discord_token = os.getenv('DISCORD_TOKEN')
@@ -128,6 +142,12 @@ def main():
         print(f"Error processing JSON file: {e}")
         return
 
+    # Filter noise before paying tokens for it
+    if filter_config is not None:
+        print("Filtering noise and near-duplicate messages...")
+        conversation, filter_stats = filter_conversation(conversation, filter_config)
+        print(format_filter_stats(filter_stats))
+
     # Compress conversation and analyze with Gemini
     print("Compressing conversation...")
     summary = compress_conversation(conversation)
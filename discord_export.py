@@ -57,7 +57,11 @@ def compress_conversation(conversation):
             author = msg.get("author", {}).get("nickname", 
                     msg.get("author", {}).get("name", "Unknown"))
             timestamp = msg.get("timestamp", "")
-            summary_lines.append(f"- {author} ({timestamp}): {content}")
+            line = f"- {author} ({timestamp}): {content}"
+            # Messages that absorbed near-duplicates (see message_filter.py)
+            if msg.get("duplicateCount", 1) > 1:
+                line += f" (x{msg['duplicateCount']})"
+            summary_lines.append(line)
     return "\n".join(summary_lines)
 
 def get_last_timestamp_file(channel_id):
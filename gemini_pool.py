@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import httpx
+from google import genai
+from google.genai import errors
+
+from token_utils import estimate_tokens
+
+# Published per-model limits (free tier). Override with GEMINI_RPM / GEMINI_TPM.
+MODEL_RATE_LIMITS = {
+    "gemini-2.0-flash": {"rpm": 15, "tpm": 1_000_000},
+}
+DEFAULT_RATE_LIMITS = {"rpm": 15, "tpm": 1_000_000}
+
+# Reasons a caller can be waiting, reported separately in the pool stats
+WAIT_REASONS = ("rate_limit", "backoff", "coalesced")
+
+# HTTP status codes worth retrying: rate limited and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+DEFAULT_QUEUE_TIMEOUT = 120.0
+
+class RateLimiter:
+    """Token-bucket limiter enforcing both requests and tokens per minute."""
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._available_requests = float(rpm)
+        self._available_tokens = float(tpm)
+        self._last_refill = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._available_requests = min(self.rpm, self._available_requests + elapsed * self.rpm / 60)
+        self._available_tokens = min(self.tpm, self._available_tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens, timeout=None):
+        """Block until one request and `tokens` tokens are available.
+
+        Args:
+            tokens (int): Estimated number of tokens the request will use
+            timeout (float, optional): Max seconds to wait before raising TimeoutError
+        """
+        # A single oversized request must still be able to go through eventually
+        tokens = min(tokens, self.tpm)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._refill()
+                if self._available_requests >= 1 and self._available_tokens >= tokens:
+                    self._available_requests -= 1
+                    self._available_tokens -= tokens
+                    return
+                wait = max((1 - self._available_requests) * 60 / self.rpm,
+                           (tokens - self._available_tokens) * 60 / self.tpm)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for Gemini rate limit capacity")
+                    wait = min(wait, remaining)
+                self._cond.wait(wait)
+
+def read_limit_override(env_var):
+    """Read a positive integer rate limit from an environment variable.
+
+    Returns None (use the model default) if the variable is unset or invalid.
+    """
+    value = os.getenv(env_var)
+    if not value:
+        return None
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        print(f"Warning: ignoring invalid {env_var}={value!r}, expected a positive integer")
+        return None
+    return limit
+
+def get_rate_limits(model):
+    """Return the RPM/TPM limits for a model, honoring GEMINI_RPM / GEMINI_TPM overrides."""
+    limits = dict(MODEL_RATE_LIMITS.get(model, DEFAULT_RATE_LIMITS))
+    rpm = read_limit_override("GEMINI_RPM")
+    if rpm:
+        limits["rpm"] = rpm
+    tpm = read_limit_override("GEMINI_TPM")
+    if tpm:
+        limits["tpm"] = tpm
+    return limits
+
+def make_request_key(api_key, model, contents, config):
+    """Build a stable key identifying identical requests for coalescing."""
+    payload = json.dumps({
+        "api_key": hashlib.sha256(api_key.encode("utf-8")).hexdigest(),
+        "model": model,
+        "contents": contents,
+        "config": config,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class GeminiClientPool:
+    """Process-wide Gemini clients shared by every session.
+
+    Requests go through a per-(API key, model) rate limiter, are retried with
+    exponential backoff on 429/5xx and connection errors, and identical requests that are
+    already in flight are coalesced so concurrent callers share one API call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._limiters = {}
+        self._in_flight = {}
+        self._stats = {
+            "requests": 0,
+            "api_calls": 0,
+            "coalesced": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "queue_depth": 0,
+            "waits": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "last_wait_seconds": 0.0,
+        }
+        for reason in WAIT_REASONS:
+            self._stats[f"{reason}_queue"] = 0
+            self._stats[f"{reason}_wait_seconds"] = 0.0
+
+    def get_client(self, api_key):
+        """Return the shared genai.Client for an API key."""
+        with self._lock:
+            if api_key not in self._clients:
+                self._clients[api_key] = genai.Client(api_key=api_key)
+            return self._clients[api_key]
+
+    def get_limiter(self, api_key, model):
+        """Return the shared rate limiter for an API key and model."""
+        with self._lock:
+            key = (api_key, model)
+            if key not in self._limiters:
+                limits = get_rate_limits(model)
+                self._limiters[key] = RateLimiter(limits["rpm"], limits["tpm"])
+            return self._limiters[key]
+
+    def generate(self, api_key, model, contents, config=None, timeout=DEFAULT_QUEUE_TIMEOUT):
+        """Generate content and return the response text.
+
+        Args:
+            api_key (str): Gemini API key
+            model (str): Model name, e.g. "gemini-2.0-flash"
+            contents (str or list): Prompt contents
+            config (dict, optional): GenerateContentConfig keyword arguments
+            timeout (float, optional): Max seconds to wait in the rate limit queue per attempt
+        """
+        config = config or {}
+        key = make_request_key(api_key, model, contents, config)
+
+        with self._lock:
+            self._stats["requests"] += 1
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self._stats["coalesced"] += 1
+
+        # Time this caller spends waiting rather than being served
+        wait_log = []
+        try:
+            # No timeout needed: the owner always resolves the future in its finally
+            # block, and a fixed limit could expire while the shared call still succeeds
+            if not is_owner:
+                with self._waiting("coalesced", wait_log):
+                    return future.result()
+
+            try:
+                text = self._generate_with_retry(api_key, model, contents, config, timeout, wait_log)
+                future.set_result(text)
+                return text
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            finally:
+                # Interrupts (KeyboardInterrupt, Streamlit reruns) skip the handlers
+                # above; make sure callers that joined this request are released
+                if not future.done():
+                    future.set_exception(RuntimeError("Coalesced Gemini request was interrupted"))
+                with self._lock:
+                    self._in_flight.pop(key, None)
+        finally:
+            self._record_wait(sum(wait_log))
+
+    def _generate_with_retry(self, api_key, model, contents, config, timeout, wait_log):
+        client = self.get_client(api_key)
+        limiter = self.get_limiter(api_key, model)
+        prompt_tokens = estimate_tokens(json.dumps(contents, default=str, ensure_ascii=False))
+
+        for attempt in range(MAX_RETRIES + 1):
+            with self._waiting("rate_limit", wait_log):
+                limiter.acquire(prompt_tokens, timeout=timeout)
+            try:
+                with self._lock:
+                    self._stats["api_calls"] += 1
+                response = client.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=genai.types.GenerateContentConfig(**config)
+                )
+                return response.text
+            except (errors.APIError, httpx.TransportError, ConnectionError, TimeoutError) as e:
+                # Connection resets and timeouts have no status code and are always retried
+                code = getattr(e, "code", None)
+                retryable = not isinstance(e, errors.APIError) or code in RETRYABLE_STATUS_CODES
+                with self._lock:
+                    if code == 429:
+                        self._stats["rate_limited"] += 1
+                    if retryable and attempt < MAX_RETRIES:
+                        self._stats["retries"] += 1
+                    else:
+                        self._stats["errors"] += 1
+                if not retryable or attempt == MAX_RETRIES:
+                    raise
+                # Exponential backoff with full jitter
+                backoff = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt))
+                with self._waiting("backoff", wait_log):
+                    time.sleep(random.uniform(0, backoff))
+
+    @contextmanager
+    def _waiting(self, reason, wait_log):
+        """Count the caller in the queue while it waits, and log how long it waited."""
+        with self._lock:
+            self._stats["queue_depth"] += 1
+            self._stats[f"{reason}_queue"] += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            waited = time.monotonic() - start
+            wait_log.append(waited)
+            with self._lock:
+                self._stats["queue_depth"] -= 1
+                self._stats[f"{reason}_queue"] -= 1
+                self._stats[f"{reason}_wait_seconds"] += waited
+
+    def _record_wait(self, waited):
+        """Record the total time one request waited for rate limits, backoff or a shared call."""
+        with self._lock:
+            self._stats["waits"] += 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["last_wait_seconds"] = waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+
+    def get_stats(self):
+        """Return a snapshot of pool usage: queue depth, wait times, coalescing and retries.
+
+        queue_depth counts every caller currently waiting, split by reason into
+        rate_limit_queue, backoff_queue and coalesced_queue. The wait_seconds
+        stats are per request and include rate limit waits, retry backoff and
+        time spent waiting on a coalesced call.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._in_flight)
+        stats["avg_wait_seconds"] = (stats["total_wait_seconds"] / stats["waits"]
+                                     if stats["waits"] else 0.0)
+        return stats
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_client_pool():
+    """Return the process-wide GeminiClientPool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = GeminiClientPool()
+        return _pool
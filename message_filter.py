@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+import copy
+import json
+import re
+import unicodedata
+import zlib
+
+from discord_export import compress_conversation
+from token_utils import estimate_tokens
+
+# Default rules for the pre-LLM noise filter. Any key can be overridden by
+# passing a partial config dict or a JSON file to load_filter_config().
+DEFAULT_FILTER_CONFIG = {
+    # Author rules
+    "drop_bots": True,
+    "allowed_bots": [],          # bot names or IDs that should be kept anyway
+    "blocked_authors": [],       # author names, nicknames or IDs to always drop
+    # Message type rules (Discord system messages)
+    "drop_message_types": [
+        "GuildMemberJoin", "ChannelPinnedMessage", "ThreadCreated",
+        "RecipientAdd", "RecipientRemove", "Call",
+        "ChannelNameChange", "ChannelIconChange",
+    ],
+    # Content heuristics
+    "min_content_chars": 1,
+    "drop_emoji_only": True,
+    "drop_patterns": [],         # regexes; matching messages are dropped
+    # Near-duplicate collapsing
+    "collapse_duplicates": True,
+    "shingle_size": 5,
+    "similarity_threshold": 0.85,
+    "duplicate_window": 50,      # how many recent kept messages to compare against
+}
+
+# Matches custom Discord emoji (<:name:id>, <a:name:id>) and :shortcodes:
+CUSTOM_EMOJI_PATTERN = re.compile(r"<a?:\w+:\d+>|:\w+:")
+
+# Joiners, variation selectors, skin tone modifiers and keycap marks that are
+# part of an emoji sequence
+EMOJI_COMPONENT_CHARS = {"\u200d", "\ufe0e", "\ufe0f", "\u20e3"}
+
+def load_filter_config(config_path=None, overrides=None):
+    """Build a filter config from the defaults, an optional JSON file and overrides.
+
+    Args:
+        config_path (str, optional): Path to a JSON file with config keys to override
+        overrides (dict, optional): Config keys to override, applied last
+
+    Raises:
+        re.error: If a drop pattern is not a valid regular expression
+    """
+    config = copy.deepcopy(DEFAULT_FILTER_CONFIG)
+    if config_path:
+        with open(config_path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    if overrides:
+        config.update(overrides)
+    # Fail early on invalid regexes rather than halfway through filtering
+    for pattern in config["drop_patterns"]:
+        re.compile(pattern)
+    return config
+
+def is_emoji_component(ch):
+    """Check if a character is part of an emoji sequence other than the emoji itself."""
+    return (ch in EMOJI_COMPONENT_CHARS
+            or "\U0001f3fb" <= ch <= "\U0001f3ff")
+
+def is_emoji_only(content):
+    """Check if a message consists only of emoji and whitespace.
+
+    Punctuation-only messages like "???" are not emoji and are kept.
+    """
+    stripped = CUSTOM_EMOJI_PATTERN.sub("", content)
+    has_emoji = len(stripped) != len(content)
+    for ch in stripped:
+        if ch.isspace() or is_emoji_component(ch):
+            continue
+        if unicodedata.category(ch) != "So":
+            return False
+        has_emoji = True
+    return has_emoji
+
+def get_author_key(msg):
+    """Return a stable key identifying the author of a message."""
+    author = msg.get("author", {})
+    return str(author.get("id") or author.get("name") or "Unknown")
+
+def normalize_content(content):
+    """Normalize message content for duplicate detection."""
+    return " ".join(content.lower().split())
+
+def get_shingles(text, size):
+    """Return the set of hashed character shingles for a normalized text."""
+    if len(text) <= size:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + size].encode("utf-8"))
+            for i in range(len(text) - size + 1)}
+
+def jaccard_similarity(a, b):
+    """Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def get_drop_reason(msg, config, compiled_patterns):
+    """Return why a message should be dropped, or None if it should be kept."""
+    author = msg.get("author", {})
+    author_keys = {str(author.get(key)) for key in ("id", "name", "nickname") if author.get(key)}
+
+    if author_keys & set(map(str, config["blocked_authors"])):
+        return "blocked_author"
+    if (config["drop_bots"] and author.get("isBot")
+            and not author_keys & set(map(str, config["allowed_bots"]))):
+        return "bot"
+    if msg.get("type") in config["drop_message_types"]:
+        return "system_message"
+
+    content = msg.get("content", "").strip()
+    if not content:
+        return "empty"
+    if len(content) < config["min_content_chars"]:
+        return "too_short"
+    if config["drop_emoji_only"] and is_emoji_only(content):
+        return "emoji_only"
+    if any(pattern.search(content) for pattern in compiled_patterns):
+        return "pattern"
+    return None
+
+def filter_conversation(conversation, config=None):
+    """Remove noise from a conversation and collapse near-duplicate messages.
+
+    Only messages from the same author within the last `duplicate_window`
+    kept messages are collapsed. Kept messages that absorbed near-duplicates
+    get a "duplicateCount" field, which compress_conversation renders as a
+    count suffix.
+
+    Args:
+        conversation (dict): Exported DiscordChatExporter JSON conversation
+        config (dict, optional): Filter config, see DEFAULT_FILTER_CONFIG
+
+    Returns:
+        tuple: (filtered conversation dict, stats dict)
+    """
+    if config is None:
+        config = load_filter_config()
+    compiled_patterns = [re.compile(p) for p in config["drop_patterns"]]
+
+    messages = conversation.get("messages", [])
+    kept = []
+    removed_by_reason = {}
+    duplicates_collapsed = 0
+
+    # Recent kept messages as (index into kept, (author, text) key, shingles),
+    # plus an exact-match index over the same window
+    recent = []
+    exact_index = {}
+
+    for msg in messages:
+        reason = get_drop_reason(msg, config, compiled_patterns)
+        if reason:
+            removed_by_reason[reason] = removed_by_reason.get(reason, 0) + 1
+            continue
+
+        if not config["collapse_duplicates"]:
+            kept.append(msg)
+            continue
+
+        author_key = get_author_key(msg)
+        normalized = normalize_content(msg.get("content", ""))
+        exact_key = (author_key, normalized)
+        match = exact_index.get(exact_key)
+        shingles = None
+        if match is None:
+            shingles = get_shingles(normalized, config["shingle_size"])
+            for idx, (other_author, _), other in reversed(recent):
+                if (other_author == author_key
+                        and jaccard_similarity(shingles, other) >= config["similarity_threshold"]):
+                    match = idx
+                    break
+
+        if match is not None:
+            kept[match]["duplicateCount"] = kept[match].get("duplicateCount", 1) + 1
+            duplicates_collapsed += 1
+            continue
+
+        kept.append(dict(msg))
+        exact_index[exact_key] = len(kept) - 1
+        recent.append((len(kept) - 1, exact_key, shingles))
+        if len(recent) > config["duplicate_window"]:
+            old_idx, old_key, _ = recent.pop(0)
+            if exact_index.get(old_key) == old_idx:
+                del exact_index[old_key]
+
+    if duplicates_collapsed:
+        removed_by_reason["near_duplicate"] = duplicates_collapsed
+
+    filtered = dict(conversation)
+    filtered["messages"] = kept
+
+    tokens_before = estimate_tokens(compress_conversation(conversation))
+    tokens_after = estimate_tokens(compress_conversation(filtered))
+    stats = {
+        "messages_before": len(messages),
+        "messages_after": len(kept),
+        "messages_removed": len(messages) - len(kept),
+        "removed_by_reason": removed_by_reason,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_removed": tokens_before - tokens_after,
+    }
+    return filtered, stats
+
+def format_filter_stats(stats):
+    """Format filter stats as a short human readable report."""
+    report = (f"Filtered {stats['messages_removed']} of {stats['messages_before']} messages, "
+              f"saving ~{stats['tokens_removed']} tokens "
+              f"(~{stats['tokens_before']} -> ~{stats['tokens_after']})")
+    if stats["removed_by_reason"]:
+        reasons = ", ".join(f"{reason}: {count}"
+                            for reason, count in sorted(stats["removed_by_reason"].items()))
+        report += f" [{reasons}]"
+    return report
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+def estimate_tokens(text):
+    """Roughly estimate the number of LLM tokens in a piece of text (~4 chars per token)."""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)